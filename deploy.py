@@ -1,11 +1,21 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
 import os
+import random
+import string
 import sys
 import time
 import subprocess
-import requests
 from pathlib import Path
-from typing import Optional, Dict, Any
-import vastai_sdk
+from typing import Optional, Dict, Any, Tuple, TYPE_CHECKING
+
+# vastai_sdk (and the requests/urllib3 stack it drags in) costs hundreds of ms
+# to import; defer it to the call sites so e.g. --help-style invocations stay fast.
+if TYPE_CHECKING:
+    import vastai_sdk
 
 # --- Configuration ---
 DOCKER_IMAGE = "motilin/huggingface-pytorch-ml:latest"
@@ -18,7 +28,10 @@ HF_TOKEN = os.getenv("HUGGING_FACE_TOKEN")
 SSH_PUBLIC_KEY_PATH = os.path.expanduser("~/.ssh/id_ed25519.pub")
 SSH_CONFIG_ALIAS = "vast-ai-dev"
 POLL_TIMEOUT_MINS = 5
-POLL_INTERVAL_SECS = 20
+BASE_DELAY = 2.0   # First retry delay in seconds
+MAX_DELAY = 30.0   # Cap on the backoff delay
+OFFER_CACHE_PATH = Path.home() / ".cache" / "vast-ai-tools" / "offers.json"
+OFFER_CACHE_TTL_SECS = 300
 
 # --- onstart_cmd for HF login and VS Code cleanup ---
 ONSTART_CMD = """
@@ -34,25 +47,40 @@ huggingface-cli login --token "${HUGGING_FACE_TOKEN}" --add-to-git-credential
 echo "[+] Hugging Face login complete."
 """
 
-def find_and_create_instance(client: vastai_sdk.VastAI) -> Optional[int]:
-    print(f"🔍 Searching for a {GPU_TYPE} under ${MAX_PRICE}/hr...")
-    query = f"num_gpus={GPU_COUNT} gpu_name={GPU_TYPE} rented=False verified=True dph_total<={MAX_PRICE}"
-    order = "score-"
+def load_cached_offers(query: str) -> Optional[list]:
+    """Return the cached offer list if it is fresh and matches the query."""
     try:
-        offers = client.search_offers(query=query, order=order, type='on-demand')
-        if not offers:
-            print(f"❌ No matching instances found.", file=sys.stderr)
+        if time.time() - OFFER_CACHE_PATH.stat().st_mtime > OFFER_CACHE_TTL_SECS:
+            return None
+        data = json.loads(OFFER_CACHE_PATH.read_text())
+        if data.get("query") != query:
             return None
-        best_offer = offers[0]
-        offer_id = best_offer['id']
-        price = best_offer.get('dph_total', 'N/A')
-        print(f"✅ Found offer {offer_id} for ${price}/hr. Creating instance...")
-        # Read public key content
-        with open(SSH_PUBLIC_KEY_PATH, "r") as f:
-            public_key = f.read().strip()
-        # Environment variables and port mappings as string
-        env_str = f'-e HUGGING_FACE_TOKEN="{HF_TOKEN}" -e SSH_PUB_KEY="{public_key}" -p 8080'
-        result = client.create_instance(
+        return data.get("offers") or None
+    except (OSError, ValueError):
+        return None
+
+def save_cached_offers(query: str, offers: list) -> None:
+    try:
+        OFFER_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        OFFER_CACHE_PATH.write_text(json.dumps({"query": query, "offers": offers}))
+    except (OSError, TypeError) as e:
+        print(f"⚠️ Could not cache offers: {e}", file=sys.stderr)
+
+def clear_offer_cache() -> None:
+    try:
+        OFFER_CACHE_PATH.unlink()
+    except OSError:
+        pass
+
+def try_offers(client: vastai_sdk.VastAI, offers: list, public_key: str) -> Optional[int]:
+    """Walk an offer list trying create_instance until one accepts the contract."""
+    env_str = f'-e HUGGING_FACE_TOKEN="{HF_TOKEN}" -e SSH_PUB_KEY="{public_key}" -p 8080'
+    for offer in offers:
+        offer_id = offer['id']
+        price = offer.get('dph_total', 'N/A')
+        print(f"✅ Trying offer {offer_id} for ${price}/hr. Creating instance...")
+        result = create_instance(
+            client,
             id=offer_id,
             image=DOCKER_IMAGE,
             disk=float(DISK_SPACE_GB),
@@ -65,23 +93,167 @@ def find_and_create_instance(client: vastai_sdk.VastAI) -> Optional[int]:
         if result and result.get("success"):
             instance_id = result.get("new_contract")
             print(f"🚀 Instance {instance_id} creation initiated.")
+            # The winning offer is rented now; a stale cache would only replay
+            # dead entries on the next run.
+            clear_offer_cache()
             return instance_id
-        else:
-            print(f"❌ Instance creation failed: {result.get('msg', 'Unknown error')}", file=sys.stderr)
+        print(f"⚠️ Offer {offer_id} failed: {result.get('msg', 'Unknown error')}. Trying next offer...",
+              file=sys.stderr)
+    return None
+
+def find_and_create_instance(client: vastai_sdk.VastAI, public_key: str) -> Optional[int]:
+    query = f"num_gpus={GPU_COUNT} gpu_name={GPU_TYPE} rented=False verified=True dph_total<={MAX_PRICE}"
+    order = "score-"
+    try:
+        # A failed deploy is usually re-run within minutes; reuse the last
+        # search result instead of re-querying the whole marketplace.
+        cached_offers = load_cached_offers(query)
+        if cached_offers:
+            print(f"♻️ Reusing {len(cached_offers)} cached offers (< {OFFER_CACHE_TTL_SECS}s old).")
+            instance_id = try_offers(client, cached_offers, public_key)
+            if instance_id:
+                return instance_id
+            # All cached offers are dead; drop them and fall through to a live search
+            print(f"⚠️ All {len(cached_offers)} cached offers failed. Searching fresh...", file=sys.stderr)
+            clear_offer_cache()
+        print(f"🔍 Searching for a {GPU_TYPE} under ${MAX_PRICE}/hr...")
+        offers = client.search_offers(query=query, order=order, type='on-demand')
+        if not offers:
+            print(f"❌ No matching instances found.", file=sys.stderr)
             return None
+        save_cached_offers(query, offers[:10])
+        instance_id = try_offers(client, offers, public_key)
+        if instance_id:
+            return instance_id
+        print(f"❌ Instance creation failed for all {len(offers)} offers.", file=sys.stderr)
+        return None
     except Exception as e:
         print(f"❌ Error during instance creation: {e}", file=sys.stderr)
         return None
 
-def poll_for_ssh_readiness(client: vastai_sdk.VastAI, instance_id: int) -> Optional[Dict[str, Any]]:
+def retry_api_call(max_attempts: int = 3, base: float = 1.0, cap: float = 30.0, jitter: float = 0.5):
+    """Retry transient API failures with jittered exponential backoff.
+    Connection errors, timeouts and 429/5xx responses are retried; anything
+    else (e.g. a 401 from a bad API key) fails immediately."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            import requests
+            for attempt in range(max_attempts):
+                try:
+                    return func(*args, **kwargs)
+                except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                    response = getattr(e, "response", None)
+                    if response is not None and response.status_code not in (429, 500, 502, 503, 504):
+                        raise
+                    if attempt == max_attempts - 1:
+                        raise
+                    delay = min(cap, base * 2 ** attempt) * (1 + random.uniform(-jitter, jitter))
+                    print(f"⚠️ Transient API error: {e}. Retrying in {delay:.1f}s...", file=sys.stderr)
+                    time.sleep(delay)
+        return wrapper
+    return decorator
+
+@retry_api_call()
+def create_instance(client: vastai_sdk.VastAI, **kwargs) -> Optional[Dict[str, Any]]:
+    return client.create_instance(**kwargs)
+
+@retry_api_call()
+def show_instance(client: vastai_sdk.VastAI, instance_id: int) -> Optional[Dict[str, Any]]:
+    return client.show_instance(id=instance_id)
+
+@retry_api_call()
+def fetch_logs(client: vastai_sdk.VastAI, instance_id: int) -> Optional[str]:
+    return client.logs(INSTANCE_ID=instance_id)
+
+@retry_api_call()
+def destroy_instance(client: vastai_sdk.VastAI, instance_id: int) -> None:
+    client.destroy_instance(id=instance_id)
+
+def configure_http_pool(client: vastai_sdk.VastAI) -> None:
+    """Mount a pooled requests.Session on the SDK client so repeated API calls
+    (e.g. the readiness polling loop) reuse TCP/TLS connections instead of
+    handshaking from scratch, with a shared retry-with-backoff policy."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=4,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+    )
+    session.mount("https://", adapter)
+    try:
+        if hasattr(client, "session"):
+            client.session = session
+        else:
+            client._session = session
+    except Exception as e:
+        print(f"⚠️ Could not configure HTTP connection pool on SDK client: {e}", file=sys.stderr)
+
+async def check_ssh_banner_async(host: str, port: int) -> bool:
+    """Verify the SSH daemon is accepting TCP connections by reading its banner.
+    Async so the probe can overlap the API call."""
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, int(port)), timeout=3
+        )
+        try:
+            banner = await asyncio.wait_for(reader.read(4), timeout=3)
+            return banner.startswith(b"SSH-")
+        finally:
+            writer.close()
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+def verify_ssh_login(ssh_host: str, ssh_port: int) -> bool:
+    """Full ssh login check, run only after the banner probe succeeds."""
+    try:
+        # argv list instead of shell=True: no /bin/sh fork, and host/port
+        # strings can't be interpreted as shell syntax
+        command = [
+            "ssh", "-p", str(ssh_port),
+            "-o", "ConnectTimeout=10",
+            "-o", "BatchMode=yes",
+            "-o", "StrictHostKeyChecking=no",
+            f"root@{ssh_host}", "echo", "SSH_OK",
+        ]
+        result = subprocess.run(command, capture_output=True, text=True, timeout=15)
+        if result.returncode == 0 and "SSH_OK" in result.stdout:
+            return True
+        print(f" SSH connection failed. Retrying... (stdout: {result.stdout}, stderr: {result.stderr})")
+    except subprocess.TimeoutExpired:
+        print(f" SSH command timed out. Retrying...")
+    return False
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter: short first waits catch fast boots,
+    randomization keeps concurrent deploys from hammering the API in lockstep."""
+    return min(MAX_DELAY, BASE_DELAY * 2 ** attempt) * (0.5 + random.random() * 0.5)
+
+async def poll_for_ssh_readiness_async(client: vastai_sdk.VastAI, instance_id: int) -> Optional[Dict[str, Any]]:
     print(f"⏳ Waiting for instance {instance_id} to become fully ready...")
     start_time = time.time()
     timeout_seconds = POLL_TIMEOUT_MINS * 60
+    attempt = 0
+    last_status = None
+    # Host/port from the previous API report; probed while the next call is in flight.
+    latest_host_port: Optional[Tuple[str, int]] = None
     while time.time() - start_time < timeout_seconds:
         try:
-            instance = client.show_instance(id=instance_id)
+            # Overlap the ~0.5s API round trip with the TCP banner probe instead
+            # of running them back to back.
+            api_call = asyncio.to_thread(show_instance, client, instance_id)
+            if latest_host_port:
+                instance, banner_ok = await asyncio.gather(
+                    api_call, check_ssh_banner_async(*latest_host_port)
+                )
+            else:
+                instance, banner_ok = await api_call, False
             if not instance:
-                time.sleep(POLL_INTERVAL_SECS)
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
                 continue
             ssh_host = instance.get("public_ipaddr")
             ports = instance.get("ports", {})
@@ -95,53 +267,66 @@ def poll_for_ssh_readiness(client: vastai_sdk.VastAI, instance_id: int) -> Optio
                 connection_type = "proxy"
             if ssh_host and ssh_port:
                 print(f" API reports {connection_type} connection ready at {ssh_host}:{ssh_port}. Verifying...")
-                try:
-                    command = (
-                        f"ssh -p {ssh_port} -o ConnectTimeout=10 -o BatchMode=yes "
-                        f"-o StrictHostKeyChecking=no root@{ssh_host} echo 'SSH_OK'"
-                    )
-                    result = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=15)
-                    if result.returncode == 0 and "SSH_OK" in result.stdout:
+                # The banner result is for the previously reported endpoint; only
+                # trust it if the endpoint has not changed since.
+                if banner_ok and latest_host_port == (ssh_host, ssh_port):
+                    if verify_ssh_login(ssh_host, ssh_port):
                         print(f"✅ SSH Connection Verified! Instance is fully ready.")
                         return {"ssh_host": ssh_host, "ssh_port": ssh_port}
-                    else:
-                        print(f" SSH connection failed. Retrying... (stdout: {result.stdout}, stderr: {result.stderr})")
-                except subprocess.TimeoutExpired:
-                    print(f" SSH command timed out. Retrying...")
+                else:
+                    print(f" SSH daemon not accepting connections yet. Retrying...")
+                latest_host_port = (ssh_host, ssh_port)
             actual_status = instance.get("actual_status", "")
             if "error" in (instance.get("status_msg") or "").lower():
                 print(f"❌ Instance entered failed state: {instance.get('status_msg')}")
                 return None
             print(f" Current status: {actual_status or 'initializing'} | Waiting for SSH handshake...")
-            time.sleep(POLL_INTERVAL_SECS)
+            # A status transition counts as progress, so restart the backoff curve.
+            if actual_status != last_status:
+                last_status = actual_status
+                attempt = 0
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
         except Exception as e:
+            # Transient API errors reset the backoff; the instance may be fine.
             print(f"⚠️ Warning during polling: {e}. Retrying...", file=sys.stderr)
-            time.sleep(POLL_INTERVAL_SECS)
+            attempt = 0
+            await asyncio.sleep(backoff_delay(attempt))
     print(f"⏰ Timed out waiting for instance to become fully ready.", file=sys.stderr)
     return None
 
+def poll_for_ssh_readiness(client: vastai_sdk.VastAI, instance_id: int) -> Optional[Dict[str, Any]]:
+    return asyncio.run(poll_for_ssh_readiness_async(client, instance_id))
+
+# Parsed once at import; update_ssh_config only substitutes per-instance values
+SSH_CONFIG_TEMPLATE = string.Template("""
+Host $alias
+    HostName $hostname
+    User $user
+    Port $port
+    StrictHostKeyChecking no
+    UserKnownHostsFile /dev/null
+    ConnectTimeout 10
+    ControlMaster auto
+    ControlPath ~/.ssh/cm-%r@%h:%p
+    ControlPersist 600
+""")
+
 def update_ssh_config(alias: str, hostname: str, port: int, user: str = "root"):
     print("📝 Updating local SSH configuration...")
     ssh_dir = Path.home() / ".ssh"
     config_d_dir = ssh_dir / "config.d"
     instance_config_file = config_d_dir / f"vast-ai-{alias}"
     config_d_dir.mkdir(exist_ok=True)
-    config_content = f"""
-Host {alias}
-    HostName {hostname}
-    User {user}
-    Port {port}
-    StrictHostKeyChecking no
-    UserKnownHostsFile /dev/null
-    ConnectTimeout 10
-"""
-    instance_config_file.write_text(config_content)
+    instance_config_file.write_text(
+        SSH_CONFIG_TEMPLATE.substitute(alias=alias, hostname=hostname, port=port, user=user)
+    )
     print(f" ✅ SSH config written to: {instance_config_file}")
 
 def retrieve_instance_logs(client: vastai_sdk.VastAI, instance_id: int):
     print(f"🔬 Retrieving internal logs for instance {instance_id} via API...")
     try:
-        log_content = client.logs(INSTANCE_ID=instance_id)
+        log_content = fetch_logs(client, instance_id)
         print("\n" + "="*25 + " INSTANCE LOGS " + "="*25)
         print(log_content or "Logs were empty.")
         print("="*60)
@@ -152,17 +337,23 @@ def main():
     if not VASTAI_API_KEY:
         print("Error: VASTAI_API_KEY environment variable not set.", file=sys.stderr)
         sys.exit(1)
+    import vastai_sdk
     client = vastai_sdk.VastAI(api_key=VASTAI_API_KEY)
+    configure_http_pool(client)
+    # Read the public key once; it is reused for account registration and env setup.
+    try:
+        public_key = Path(SSH_PUBLIC_KEY_PATH).read_text().strip()
+    except OSError as e:
+        print(f"Error: Could not read SSH public key at {SSH_PUBLIC_KEY_PATH}: {e}", file=sys.stderr)
+        sys.exit(1)
     try:
-        with open(SSH_PUBLIC_KEY_PATH, "r") as f:
-            public_key = f.read()
         client.create_ssh_key(ssh_key=public_key)
         print("🔑 SSH key ensured on Vast.ai account.")
     except Exception as e:
         print(f"⚠️ Could not add SSH key (it may already exist): {e}")
     instance_id = None
     try:
-        instance_id = find_and_create_instance(client)
+        instance_id = find_and_create_instance(client, public_key)
         if not instance_id: sys.exit(1)
         connection_details = poll_for_ssh_readiness(client, instance_id)
         if connection_details:
@@ -184,7 +375,7 @@ def main():
             retrieve_instance_logs(client, instance_id)
             print(f"🔥 Destroying failed instance {instance_id}...")
             try:
-                client.destroy_instance(id=instance_id)
+                destroy_instance(client, instance_id)
                 print(f"✅ Instance {instance_id} destroyed.")
             except Exception as destroy_e:
                 print(f"❌ Failed to destroy instance {instance_id}: {destroy_e}", file=sys.stderr)
@@ -1,5 +1,4 @@
 import os
-import vastai_sdk
 
 # --- CONFIG ---
 INSTANCE_ID_TO_DEBUG = 24380924
@@ -9,6 +8,10 @@ VASTAI_API_KEY = os.getenv("VASTAI_API_KEY")
 if not VASTAI_API_KEY:
     print("Error: VASTAI_API_KEY environment variable not set.")
 else:
+    # Deferred: vastai_sdk pulls in the whole requests stack, which is slow to
+    # import and pointless when the API key is missing
+    import vastai_sdk
+
     client = vastai_sdk.VastAI(api_key=VASTAI_API_KEY)
     
     # The 'logs' command will return the full stdout of the container startup process
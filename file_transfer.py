@@ -1,26 +1,56 @@
+import concurrent.futures
 import configparser
+import functools
+import glob
 import os
 from pathlib import Path
+import re
 import subprocess
 import sys
 from typing import List, Dict, Optional, Tuple
 
+# Host alias chosen for this session; parsing and prompting happen at most once.
+_cached_alias: Optional[str] = None
 
-def retrieve_ssh_details() -> str:
+# Compiled once; a single regex sweep per file replaces per-line Python iteration.
+_HOST_RE = re.compile(r'(?mi)^\s*Host\s+(.+)$')
+_INCLUDE_RE = re.compile(r'(?mi)^\s*Include\s+(.+)$')
+
+# Multiplex every transfer over one persistent SSH connection so only the
+# first rsync in a session pays the TCP/SSH handshake cost.
+_SSH_MULTIPLEX = (
+    "ssh -o ControlMaster=auto -o ControlPath=~/.ssh/cm-%r@%h:%p -o ControlPersist=600"
+)
+
+# Static argv prefix shared by every transfer; per-call commands only append
+# source and destination. --partial --inplace lets interrupted large transfers
+# resume instead of restarting from byte zero on flaky Vast connections.
+_RSYNC_BASE = ("rsync", "-avz", "--compress-level=1", "--partial", "--inplace",
+               "--progress", "-e", _SSH_MULTIPLEX)
+
+
+def reset_ssh_cache() -> None:
+    """Clear the memoized host list and selected alias (e.g. after editing configs)."""
+    global _cached_alias
+    _cached_alias = None
+    _parse_ssh_config.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_ssh_config() -> Tuple[str, ...]:
     """
-    Parse SSH configs, collect hosts, prompt if multiple, return selected alias.
-    
-    This function reads the main SSH config file (~/.ssh/config) and any included
-    config files (typically from ~/.ssh/config.d/) to extract all available host aliases.
-    It then prompts the user to select a host if multiple are available.
-    
+    Parse SSH configs and collect host aliases.
+
+    Reads the main SSH config file (~/.ssh/config) and any included config files
+    (typically from ~/.ssh/config.d/) to extract all available host aliases.
+    The result is cached so batch transfers don't re-read the files per call.
+
     Returns:
-        str: The selected host alias
-        
+        Tuple[str, ...]: All host aliases found, in config order
+
     Raises:
         FileNotFoundError: If no SSH config file exists at ~/.ssh/config
         ValueError: If no SSH hosts are found in the config files
-        KeyboardInterrupt: If the user cancels the host selection
     """
     config_dir = Path(os.path.expanduser("~/.ssh"))
     main_config = config_dir / "config"
@@ -29,72 +59,89 @@ def retrieve_ssh_details() -> str:
     if not main_config.exists():
         raise FileNotFoundError(f"No SSH config at {main_config}")
     
-    # Find Include patterns by reading the file directly
+    # Expand Include patterns with glob instead of hand-parsing wildcards
     include_files = [main_config]
     try:
-        with open(main_config, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith('Include '):
-                    include_pattern = line[8:].strip()  # Remove 'Include ' prefix
-                    if '*' in include_pattern:
-                        # Handle wildcard includes like 'config.d/*'
-                        include_dir = config_dir / include_pattern.split('*')[0].strip('/')
-                        if include_dir.exists() and include_dir.is_dir():
-                            include_files.extend([f for f in include_dir.glob('*') if f.is_file()])
-                    else:
-                        # Handle direct includes
-                        include_file = config_dir / include_pattern
-                        if include_file.exists() and include_file.is_file():
-                            include_files.append(include_file)
+        for pattern in _INCLUDE_RE.findall(main_config.read_text()):
+            # Relative include paths are resolved against ~/.ssh, per ssh_config(5)
+            expanded = os.path.expanduser(pattern.strip())
+            if not os.path.isabs(expanded):
+                expanded = str(config_dir / expanded)
+            # Fast path for the common "dir/*" include: scandir carries file-type
+            # info from the directory read itself, so no extra stat per entry
+            if expanded.endswith(os.sep + '*'):
+                include_dir = expanded[:-2]
+                if os.path.isdir(include_dir):
+                    with os.scandir(include_dir) as entries:
+                        include_files.extend(sorted(Path(e.path) for e in entries if e.is_file()))
+                continue
+            include_files.extend(Path(p) for p in sorted(glob.glob(expanded)))
     except Exception as e:
         print(f"Warning: Error reading includes from {main_config}: {e}", file=sys.stderr)
-    
-    # Parse all files for Hosts
+
+    # Parse all files for Hosts: one read and one regex pass per file
     all_hosts: List[str] = []
+    seen = set()
     for file_path in include_files:
-        if not file_path.exists():
+        if not file_path.is_file():
             continue
-            
         try:
-            with open(file_path, 'r') as f:
-                current_hosts = []
-                for line in f:
-                    line = line.strip()
-                    # Skip comments and empty lines
-                    if not line or line.startswith('#'):
-                        continue
-                    
-                    # Handle Host declarations
-                    if line.startswith('Host '):
-                        # Extract host aliases from the line
-                        host_aliases = line[5:].strip().split()
-                        # Skip wildcard hosts
-                        for alias in host_aliases:
-                            if alias != '*' and alias not in all_hosts:
-                                all_hosts.append(alias)
+            text = file_path.read_text()
         except Exception as e:
             print(f"Warning: Error reading {file_path}: {e}", file=sys.stderr)
             continue
-    
+        for host_line in _HOST_RE.findall(text):
+            # Skip wildcard hosts
+            for alias in host_line.split():
+                if alias != '*' and alias not in seen:
+                    seen.add(alias)
+                    all_hosts.append(alias)
+
     if not all_hosts:
         raise ValueError("No SSH hosts found in configs")
-    
+
+    return tuple(all_hosts)
+
+
+def retrieve_ssh_details() -> str:
+    """
+    Return the SSH host alias to use, prompting once if multiple exist.
+
+    The parsed host list and the user's selection are cached for the lifetime
+    of the process, so repeated transfer calls don't re-parse the configs or
+    re-prompt. Call reset_ssh_cache() to force a fresh selection.
+
+    Returns:
+        str: The selected host alias
+
+    Raises:
+        FileNotFoundError: If no SSH config file exists at ~/.ssh/config
+        ValueError: If no SSH hosts are found in the config files
+        KeyboardInterrupt: If the user cancels the host selection
+    """
+    global _cached_alias
+    if _cached_alias is not None:
+        return _cached_alias
+
+    all_hosts = _parse_ssh_config()
+
     # If only one host, return it directly
     if len(all_hosts) == 1:
-        return all_hosts[0]
-    
+        _cached_alias = all_hosts[0]
+        return _cached_alias
+
     # Prompt user to select from multiple hosts
     print("Available SSH hosts:")
     for i, host in enumerate(all_hosts, 1):
         print(f"{i}. {host}")
-    
+
     try:
         while True:
             try:
                 choice = int(input("Select host number: "))
                 if 1 <= choice <= len(all_hosts):
-                    return all_hosts[choice - 1]
+                    _cached_alias = all_hosts[choice - 1]
+                    return _cached_alias
                 print(f"Invalid choice. Please enter a number between 1 and {len(all_hosts)}.")
             except ValueError:
                 print("Please enter a valid number.")
@@ -103,7 +150,7 @@ def retrieve_ssh_details() -> str:
         raise
 
 
-def upload_file(local_path: str, remote_path: str) -> None:
+def upload_file(local_path: str, remote_path: str, alias: Optional[str] = None) -> None:
     """
     Upload a single file to the remote instance using rsync.
     
@@ -114,18 +161,20 @@ def upload_file(local_path: str, remote_path: str) -> None:
     Args:
         local_path (str): Path to the local file to upload
         remote_path (str): Destination path on the remote host
-        
+        alias (Optional[str]): SSH host alias to use; resolved from configs if omitted
+
     Raises:
         ValueError: If the local path doesn't exist or is not a file
         subprocess.CalledProcessError: If the rsync command fails
         FileNotFoundError: If SSH config is not found or no hosts are available
     """
-    try:
-        alias = retrieve_ssh_details()
-    except (FileNotFoundError, ValueError, KeyboardInterrupt) as e:
-        print(f"Error retrieving SSH details: {e}")
-        raise
-        
+    if alias is None:
+        try:
+            alias = retrieve_ssh_details()
+        except (FileNotFoundError, ValueError, KeyboardInterrupt) as e:
+            print(f"Error retrieving SSH details: {e}")
+            raise
+
     local_file = Path(local_path)
     if not local_file.exists():
         raise ValueError(f"Local path does not exist: {local_path}")
@@ -138,23 +187,22 @@ def upload_file(local_path: str, remote_path: str) -> None:
         remote_file = remote_path + local_file.name
     
     # Construct and execute rsync command
-    cmd = ["rsync", "-avz", "--progress", str(local_file), f"{alias}:{remote_file}"]
+    cmd = list(_RSYNC_BASE) + [str(local_file), f"{alias}:{remote_file}"]
     try:
         print(f"Uploading {local_path} to {alias}:{remote_file}...")
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        # Inherit stdout/stderr so --progress streams live instead of being
+        # buffered in memory until the transfer finishes
+        subprocess.run(cmd, check=True)
         print(f"Successfully uploaded {local_path} to {remote_file}")
-        if result.stdout:
-            print(result.stdout)
     except subprocess.CalledProcessError as e:
-        error_msg = f"Upload failed: {e.stderr if e.stderr else str(e)}"
-        print(error_msg, file=sys.stderr)
-        raise subprocess.CalledProcessError(e.returncode, e.cmd, error_msg)
+        print(f"Upload failed: {e}", file=sys.stderr)
+        raise
     except Exception as e:
         print(f"Unexpected error during upload: {e}", file=sys.stderr)
         raise
 
 
-def download_file(remote_path: str, local_path: str) -> None:
+def download_file(remote_path: str, local_path: str, alias: Optional[str] = None) -> None:
     """
     Download a single file from the remote instance using rsync.
     
@@ -164,17 +212,19 @@ def download_file(remote_path: str, local_path: str) -> None:
     Args:
         remote_path (str): Path to the remote file to download
         local_path (str): Destination path on the local machine
-        
+        alias (Optional[str]): SSH host alias to use; resolved from configs if omitted
+
     Raises:
         subprocess.CalledProcessError: If the rsync command fails
         FileNotFoundError: If SSH config is not found or no hosts are available
     """
-    try:
-        alias = retrieve_ssh_details()
-    except (FileNotFoundError, ValueError, KeyboardInterrupt) as e:
-        print(f"Error retrieving SSH details: {e}")
-        raise
-    
+    if alias is None:
+        try:
+            alias = retrieve_ssh_details()
+        except (FileNotFoundError, ValueError, KeyboardInterrupt) as e:
+            print(f"Error retrieving SSH details: {e}")
+            raise
+
     # Ensure local directory exists
     local_dir = Path(local_path).parent
     if not local_dir.exists():
@@ -186,23 +236,20 @@ def download_file(remote_path: str, local_path: str) -> None:
             raise
     
     # Construct and execute rsync command
-    cmd = ["rsync", "-avz", "--progress", f"{alias}:{remote_path}", local_path]
+    cmd = list(_RSYNC_BASE) + [f"{alias}:{remote_path}", local_path]
     try:
         print(f"Downloading {alias}:{remote_path} to {local_path}...")
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        subprocess.run(cmd, check=True)
         print(f"Successfully downloaded {remote_path} to {local_path}")
-        if result.stdout:
-            print(result.stdout)
     except subprocess.CalledProcessError as e:
-        error_msg = f"Download failed: {e.stderr if e.stderr else str(e)}"
-        print(error_msg, file=sys.stderr)
-        raise subprocess.CalledProcessError(e.returncode, e.cmd, error_msg)
+        print(f"Download failed: {e}", file=sys.stderr)
+        raise
     except Exception as e:
         print(f"Unexpected error during download: {e}", file=sys.stderr)
         raise
 
 
-def upload_folder(local_dir: str, remote_dir: str) -> None:
+def upload_folder(local_dir: str, remote_dir: str, alias: Optional[str] = None) -> None:
     """
     Upload a folder recursively to the remote instance using rsync.
     
@@ -213,18 +260,20 @@ def upload_folder(local_dir: str, remote_dir: str) -> None:
     Args:
         local_dir (str): Path to the local directory to upload
         remote_dir (str): Destination directory path on the remote host
-        
+        alias (Optional[str]): SSH host alias to use; resolved from configs if omitted
+
     Raises:
         ValueError: If the local path doesn't exist or is not a directory
         subprocess.CalledProcessError: If the rsync command fails
         FileNotFoundError: If SSH config is not found or no hosts are available
     """
-    try:
-        alias = retrieve_ssh_details()
-    except (FileNotFoundError, ValueError, KeyboardInterrupt) as e:
-        print(f"Error retrieving SSH details: {e}")
-        raise
-        
+    if alias is None:
+        try:
+            alias = retrieve_ssh_details()
+        except (FileNotFoundError, ValueError, KeyboardInterrupt) as e:
+            print(f"Error retrieving SSH details: {e}")
+            raise
+
     local_directory = Path(local_dir)
     if not local_directory.exists():
         raise ValueError(f"Local directory does not exist: {local_dir}")
@@ -236,23 +285,20 @@ def upload_folder(local_dir: str, remote_dir: str) -> None:
     remote_target = remote_dir.rstrip('/') + '/'
     
     # Construct and execute rsync command
-    cmd = ["rsync", "-avz", "--progress", local_source, f"{alias}:{remote_target}"]
+    cmd = list(_RSYNC_BASE) + [local_source, f"{alias}:{remote_target}"]
     try:
         print(f"Uploading folder {local_dir} to {alias}:{remote_target}...")
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        subprocess.run(cmd, check=True)
         print(f"Successfully uploaded folder {local_dir} to {remote_target}")
-        if result.stdout:
-            print(result.stdout)
     except subprocess.CalledProcessError as e:
-        error_msg = f"Upload failed: {e.stderr if e.stderr else str(e)}"
-        print(error_msg, file=sys.stderr)
-        raise subprocess.CalledProcessError(e.returncode, e.cmd, error_msg)
+        print(f"Upload failed: {e}", file=sys.stderr)
+        raise
     except Exception as e:
         print(f"Unexpected error during folder upload: {e}", file=sys.stderr)
         raise
 
 
-def download_folder(remote_dir: str, local_dir: str) -> None:
+def download_folder(remote_dir: str, local_dir: str, alias: Optional[str] = None) -> None:
     """
     Download a folder recursively from the remote instance using rsync.
     
@@ -263,17 +309,19 @@ def download_folder(remote_dir: str, local_dir: str) -> None:
     Args:
         remote_dir (str): Path to the remote directory to download
         local_dir (str): Destination directory path on the local machine
-        
+        alias (Optional[str]): SSH host alias to use; resolved from configs if omitted
+
     Raises:
         subprocess.CalledProcessError: If the rsync command fails
         FileNotFoundError: If SSH config is not found or no hosts are available
     """
-    try:
-        alias = retrieve_ssh_details()
-    except (FileNotFoundError, ValueError, KeyboardInterrupt) as e:
-        print(f"Error retrieving SSH details: {e}")
-        raise
-    
+    if alias is None:
+        try:
+            alias = retrieve_ssh_details()
+        except (FileNotFoundError, ValueError, KeyboardInterrupt) as e:
+            print(f"Error retrieving SSH details: {e}")
+            raise
+
     # Ensure local directory exists
     local_directory = Path(local_dir)
     if not local_directory.exists():
@@ -289,22 +337,125 @@ def download_folder(remote_dir: str, local_dir: str) -> None:
     local_target = str(local_directory) + '/'
     
     # Construct and execute rsync command
-    cmd = ["rsync", "-avz", "--progress", f"{alias}:{remote_source}", local_target]
+    cmd = list(_RSYNC_BASE) + [f"{alias}:{remote_source}", local_target]
     try:
         print(f"Downloading folder {alias}:{remote_source} to {local_target}...")
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        subprocess.run(cmd, check=True)
         print(f"Successfully downloaded folder {remote_source} to {local_target}")
-        if result.stdout:
-            print(result.stdout)
     except subprocess.CalledProcessError as e:
-        error_msg = f"Download failed: {e.stderr if e.stderr else str(e)}"
-        print(error_msg, file=sys.stderr)
-        raise subprocess.CalledProcessError(e.returncode, e.cmd, error_msg)
+        print(f"Download failed: {e}", file=sys.stderr)
+        raise
     except Exception as e:
         print(f"Unexpected error during folder download: {e}", file=sys.stderr)
         raise
 
 
+def upload_files(pairs: List[Tuple[str, str]], max_workers: int = 4,
+                 alias: Optional[str] = None) -> None:
+    """
+    Upload multiple files in parallel using a thread pool.
+
+    Each (local_path, remote_path) pair is handed to upload_file in a worker
+    thread. The rsync subprocesses are network-bound and release the GIL while
+    waiting, so transfers scale with available bandwidth; combined with SSH
+    connection multiplexing they all share a single SSH connection.
+
+    Args:
+        pairs (List[Tuple[str, str]]): (local_path, remote_path) pairs to upload
+        max_workers (int): Maximum number of concurrent rsync processes
+        alias (Optional[str]): SSH host alias to use; resolved from configs if omitted
+
+    Raises:
+        RuntimeError: If any upload fails; the message lists every failed pair
+        FileNotFoundError: If SSH config is not found or no hosts are available
+    """
+    if alias is None:
+        try:
+            alias = retrieve_ssh_details()
+        except (FileNotFoundError, ValueError, KeyboardInterrupt) as e:
+            print(f"Error retrieving SSH details: {e}")
+            raise
+
+    failures: List[str] = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(upload_file, local, remote, alias): (local, remote)
+            for local, remote in pairs
+        }
+        for future in concurrent.futures.as_completed(futures):
+            local, remote = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failures.append(f"{local} -> {remote}: {e}")
+
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} of {len(pairs)} uploads failed:\n" + "\n".join(failures)
+        )
+
+
+def upload_many(local_paths: List[str], remote_root: str,
+                alias: Optional[str] = None) -> None:
+    """
+    Upload many files with a single rsync invocation.
+
+    Unlike upload_files, which launches one rsync per file, this feeds the whole
+    manifest to one rsync via --files-from=- on stdin, so startup, directory
+    scanning and the checksum handshake are paid once for the entire batch.
+    Paths are uploaded relative to their deepest common directory, preserving
+    structure under remote_root.
+
+    Args:
+        local_paths (List[str]): Local files (or directories) to upload
+        remote_root (str): Destination directory on the remote host
+        alias (Optional[str]): SSH host alias to use; resolved from configs if omitted
+
+    Raises:
+        ValueError: If local_paths is empty or contains a missing path
+        subprocess.CalledProcessError: If the rsync command fails
+        FileNotFoundError: If SSH config is not found or no hosts are available
+    """
+    if alias is None:
+        try:
+            alias = retrieve_ssh_details()
+        except (FileNotFoundError, ValueError, KeyboardInterrupt) as e:
+            print(f"Error retrieving SSH details: {e}")
+            raise
+
+    if not local_paths:
+        raise ValueError("No local paths given")
+    for p in local_paths:
+        if not Path(p).exists():
+            raise ValueError(f"Local path does not exist: {p}")
+
+    # Anchor the batch at the deepest common directory so relative structure
+    # is preserved under remote_root
+    src_root = Path(os.path.commonpath([os.path.abspath(p) for p in local_paths]))
+    if not src_root.is_dir():
+        src_root = src_root.parent
+    rel_paths = [str(Path(os.path.abspath(p)).relative_to(src_root)) for p in local_paths]
+
+    remote_target = remote_root.rstrip('/') + '/'
+    # -r is required explicitly here: with --files-from, rsync does not imply
+    # recursion from -a, so directory entries would otherwise upload empty
+    cmd = list(_RSYNC_BASE) + ["-r", "--files-from=-", "--relative",
+                               str(src_root) + '/', f"{alias}:{remote_target}"]
+    try:
+        print(f"Uploading {len(rel_paths)} paths from {src_root} to {alias}:{remote_target}...")
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        proc.communicate(("\n".join(rel_paths) + "\n").encode())
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+        print(f"Successfully uploaded {len(rel_paths)} paths to {remote_target}")
+    except subprocess.CalledProcessError as e:
+        print(f"Batch upload failed: {e}", file=sys.stderr)
+        raise
+    except Exception as e:
+        print(f"Unexpected error during batch upload: {e}", file=sys.stderr)
+        raise
+
+
 if __name__ == "__main__":
     """
     Example usage of the file transfer functions.
@@ -1,30 +1,66 @@
 import torch
 from diffusers import FluxPipeline
+from diffusers.models.attention_processor import FluxAttnProcessor2_0
 from transformers import BitsAndBytesConfig  # For quantization config
 
-# Define 8-bit quantization config (NF4 is a good balance for quality/speed)
-quantization_config = BitsAndBytesConfig(
-    load_in_8bit=True,  # Or load_in_4bit=True for more aggressive (but lower quality)
-    bnb_8bit_compute_dtype=torch.bfloat16  # Keep compute in bfloat16 for accuracy
-)
-
-# Load quantized pipeline
-pipe = FluxPipeline.from_pretrained(
-    "black-forest-labs/FLUX.1-dev",
-    transformer_quantization_config=quantization_config,  # Quantize the transformer (main component)
-    torch_dtype=torch.bfloat16
-)
-pipe.enable_model_cpu_offload()  # Optional: If VRAM still tight
-
-prompt = "A futuristic cityscape at sunset, with flying cars and neon lights, in the style of cyberpunk art"
-generator = torch.Generator("cuda").manual_seed(0)  # Fix generator device
-image = pipe(
-    prompt,
-    height=1024,
-    width=1024,
-    guidance_scale=3.5,
-    num_inference_steps=50,  # Reduce to 20-30 for faster testing
-    max_sequence_length=512,
-    generator=generator
-).images[0]
-image.save("image.png")
\ No newline at end of file
+# Prefer the FlashAttention SDPA backend (fused QK^T/softmax/V on Ampere+)
+torch.backends.cuda.enable_flash_sdp(True)
+
+
+def load_pipeline() -> FluxPipeline:
+    """Load, quantize, compile and warm up the FLUX pipeline (expensive: ~20-60s)."""
+    # Define 4-bit NF4 quantization config (halves weight-read bandwidth vs int8 per denoising step)
+    quantization_config = BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",  # NF4 is a good balance for quality/speed
+        bnb_4bit_compute_dtype=torch.bfloat16,  # Keep compute in bfloat16 for accuracy
+        bnb_4bit_use_double_quant=True  # Quantize the quantization constants too
+    )
+
+    # Load quantized pipeline
+    pipe = FluxPipeline.from_pretrained(
+        "black-forest-labs/FLUX.1-dev",
+        transformer_quantization_config=quantization_config,  # Quantize the transformer (main component)
+        torch_dtype=torch.bfloat16
+    )
+
+    # Keep the whole pipeline resident on GPU when it fits; model offload shuttles the
+    # text encoder and VAE over PCIe on every call, which stalls the denoising loop
+    free_vram, _ = torch.cuda.mem_get_info()
+    if free_vram > 6 * 1024**3:  # Enough headroom for activations after NF4 weights
+        pipe.to("cuda")
+    else:
+        pipe.enable_model_cpu_offload()  # Fall back only if VRAM is actually tight
+
+    # Route attention through torch's fused scaled_dot_product_attention kernel
+    pipe.transformer.set_attn_processor(FluxAttnProcessor2_0())
+
+    # Compile the transformer to fuse attention/MLP kernels across the per-step layer passes
+    pipe.transformer = torch.compile(pipe.transformer, mode="reduce-overhead", fullgraph=False)
+
+    # Warm-up: trigger compilation on a tiny dummy call so the real run isn't paying compile cost
+    pipe("warmup", height=64, width=64, guidance_scale=3.5, num_inference_steps=1, max_sequence_length=256)
+
+    return pipe
+
+
+def generate(pipe: FluxPipeline, prompt: str, output_path: str = "image.png", seed: int = 0) -> str:
+    """Generate one image from a prompt and save it to output_path."""
+    generator = torch.Generator("cuda").manual_seed(seed)  # Fix generator device
+    image = pipe(
+        prompt,
+        height=1024,
+        width=1024,
+        guidance_scale=3.5,
+        num_inference_steps=28,  # FLUX.1-dev is visually converged by ~28 steps; 50 wastes FLOPs
+        max_sequence_length=512,
+        generator=generator
+    ).images[0]
+    image.save(output_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    pipe = load_pipeline()
+    prompt = "A futuristic cityscape at sunset, with flying cars and neon lights, in the style of cyberpunk art"
+    generate(pipe, prompt)
@@ -0,0 +1,29 @@
+"""Send a prompt to a running flux_server.py and print the saved image path."""
+import socket
+import sys
+
+SOCKET_PATH = "/tmp/flux.sock"
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python flux_client.py <prompt>", file=sys.stderr)
+        sys.exit(1)
+    prompt = " ".join(sys.argv[1:])
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(SOCKET_PATH)
+            sock.sendall(prompt.encode())
+            sock.shutdown(socket.SHUT_WR)
+            reply = sock.recv(65536).decode()
+    except OSError as e:
+        print(f"Could not reach FLUX server at {SOCKET_PATH}: {e}", file=sys.stderr)
+        print("Is flux_server.py running?", file=sys.stderr)
+        sys.exit(1)
+    print(reply)
+    if reply.startswith("ERROR:"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Long-running FLUX daemon.
+
+Loads the pipeline once (quantize + compile + warm-up, ~20-60s) and then serves
+prompts over a Unix socket, so every generation after the first skips the cold
+start entirely. Start with `python flux_server.py` and submit prompts with
+flux_client.py.
+"""
+import os
+import socket
+
+from flux import load_pipeline, generate
+
+SOCKET_PATH = "/tmp/flux.sock"
+OUTPUT_DIR = "/tmp/flux-images"
+
+
+def main():
+    pipe = load_pipeline()
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    if os.path.exists(SOCKET_PATH):
+        os.remove(SOCKET_PATH)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(SOCKET_PATH)
+    server.listen(1)
+    print(f"FLUX server ready on {SOCKET_PATH}")
+    count = 0
+    try:
+        while True:
+            conn, _ = server.accept()
+            # Per-connection errors (e.g. a client that hangs up before reading
+            # the reply) must never take down the daemon itself
+            try:
+                with conn:
+                    prompt = conn.recv(65536).decode().strip()
+                    if not prompt:
+                        continue
+                    count += 1
+                    output_path = os.path.join(OUTPUT_DIR, f"image_{count:04d}.png")
+                    print(f"Generating {output_path} for prompt: {prompt}")
+                    try:
+                        generate(pipe, prompt, output_path, seed=count)
+                        conn.sendall(output_path.encode())
+                    except Exception as e:
+                        print(f"Generation failed: {e}")
+                        conn.sendall(f"ERROR: {e}".encode())
+            except OSError as e:
+                print(f"Client connection error: {e}")
+    except KeyboardInterrupt:
+        print("\nShutting down.")
+    finally:
+        server.close()
+        if os.path.exists(SOCKET_PATH):
+            os.remove(SOCKET_PATH)
+
+
+if __name__ == "__main__":
+    main()